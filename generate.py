@@ -7,20 +7,33 @@ for web-based decentralized identities, typically hosted on GitHub Pages.
 """
 
 import base64
+import configparser
 import hashlib
 import json
 import os
 import re
 import subprocess
 import sys
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 
+try:
+    import orjson
+except ImportError:  # optional speed-up, see the `fast` extra
+    orjson = None
+
 # Configuration constants
-DEFAULT_EC_CURVE = ec.SECP384R1()
+CURVE_BY_BITS = {
+    256: ec.SECP256R1(),
+    384: ec.SECP384R1(),
+    521: ec.SECP521R1(),
+}
+
+DEFAULT_EC_CURVE = CURVE_BY_BITS[256]
 
 EC_CURVE_NAMES = {
     256: "P-256",
@@ -34,6 +47,9 @@ SIGNING_ALGORITHMS = {
     521: "ES512",
 }
 
+_FOLDER_RE = re.compile(r"\.?[a-zA-Z0-9_-]+")
+_GITHUB_URL_RE = re.compile(r"github\.com[/:]([^/\s\"]+)/([^/\s\"]+?)(?:\.git)?/?$")
+
 
 def die(message: str) -> None:
     """Print error message and exit with status 1."""
@@ -41,110 +57,264 @@ def die(message: str) -> None:
     sys.exit(1)
 
 
-def convert_key_to_jwk(public_key: ec.EllipticCurvePublicKey, **options) -> Dict[str, Any]:
+def _b64u(data: bytes) -> str:
+    """Encode bytes as unpadded base64url, as required for JWK members (RFC 7515)."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def generate_key_fingerprint(der_bytes: bytes) -> str:
+    """
+    Generate a SHA-256 fingerprint of a public key.
+
+    Args:
+        der_bytes: The key's SubjectPublicKeyInfo DER encoding
+
+    Returns:
+        Hex-encoded SHA-256 hash of the key's DER encoding
+    """
+    return hashlib.sha256(der_bytes).hexdigest()
+
+
+@dataclass(frozen=True)
+class KeyMaterial:
+    """Public key data derived once and shared by the DID document builders."""
+
+    numbers: ec.EllipticCurvePublicNumbers
+    curve_size: int
+    fingerprint_hex: str
+
+    @classmethod
+    def from_public_key(cls, public_key: ec.EllipticCurvePublicKey) -> "KeyMaterial":
+        """
+        Extract the coordinates and fingerprint of a public key.
+
+        Args:
+            public_key: The EC public key
+
+        Returns:
+            KeyMaterial for the key
+        """
+        der_bytes = public_key.public_bytes(
+            serialization.Encoding.DER,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        return cls(
+            numbers=public_key.public_numbers(),
+            curve_size=public_key.curve.key_size,
+            fingerprint_hex=generate_key_fingerprint(der_bytes),
+        )
+
+
+def convert_key_to_jwk(km: KeyMaterial, **options) -> Dict[str, Any]:
     """
     Convert an elliptic curve public key to JSON Web Key (JWK) format.
 
     Args:
-        public_key: The EC public key to convert
+        km: Key material of the EC public key to convert
         **options: Additional JWK fields to include
 
     Returns:
         Dictionary representing the JWK
     """
-    numbers = public_key.public_numbers()
-    curve_size = numbers.curve.key_size
-    coordinate_size = (curve_size + 7) // 8
+    coordinate_size = (km.curve_size + 7) // 8
 
     # Convert coordinates to bytes (big-endian)
-    x_bytes = numbers.x.to_bytes(coordinate_size, "big")
-    y_bytes = numbers.y.to_bytes(coordinate_size, "big")
+    x_bytes = km.numbers.x.to_bytes(coordinate_size, "big")
+    y_bytes = km.numbers.y.to_bytes(coordinate_size, "big")
 
     return {
         "kty": "EC",
-        "crv": EC_CURVE_NAMES[curve_size],
-        "x": base64.urlsafe_b64encode(x_bytes).decode("ascii"),
-        "y": base64.urlsafe_b64encode(y_bytes).decode("ascii"),
+        "crv": EC_CURVE_NAMES[km.curve_size],
+        "x": _b64u(x_bytes),
+        "y": _b64u(y_bytes),
         **options,
     }
 
 
-def generate_key_fingerprint(public_key: ec.EllipticCurvePublicKey) -> str:
+def is_valid_did_folder_name(name: str) -> bool:
     """
-    Generate a SHA-256 fingerprint of the public key.
+    Validate DID folder name format.
 
     Args:
-        public_key: The EC public key
+        name: Folder name to validate
 
     Returns:
-        Hex-encoded SHA-256 hash of the key's DER encoding
+        True if valid, False otherwise
     """
-    der_bytes = public_key.public_bytes(
-        serialization.Encoding.DER,
-        serialization.PublicFormat.SubjectPublicKeyInfo,
-    )
-    return hashlib.sha256(der_bytes).hexdigest()
+    return _FOLDER_RE.fullmatch(name) is not None
 
 
-def is_valid_did_folder_name(name: str) -> bool:
+def parse_curve(value: str) -> ec.EllipticCurve:
     """
-    Validate DID folder name format.
+    Resolve a curve size (e.g. "256", "P-384") to an EC curve.
 
     Args:
-        name: Folder name to validate
+        value: Curve size in bits, optionally prefixed with "P-"
 
     Returns:
-        True if valid, False otherwise
+        The matching EC curve
+
+    Raises:
+        SystemExit: If the curve is not supported
     """
-    return bool(re.fullmatch(r'\.[a-zA-Z0-9_-]+|[a-zA-Z0-9_-]+', name))
+    bits = value.upper().removeprefix("P-")
+    if not bits.isdigit() or int(bits) not in CURVE_BY_BITS:
+        supported = ", ".join(str(size) for size in CURVE_BY_BITS)
+        die(f"`{value}` is not a supported curve (choose from {supported})")
+    return CURVE_BY_BITS[int(bits)]
 
 
-def infer_did_from_git(did_folder: Optional[str] = None) -> str:
+def find_git_config() -> Optional[Path]:
     """
-    Infer DID from git remote configuration.
+    Locate the config file of the current git repository.
 
-    Args:
-        did_folder: Optional folder name for the DID
+    Honours `GIT_DIR`, otherwise walks up from the working directory looking
+    for a `.git` directory or a `.git` file pointing at one (worktrees and
+    submodules).
 
     Returns:
-        Inferred DID string
+        Path to the git config file, or None if it cannot be found
+    """
+    git_dir_env = os.environ.get("GIT_DIR")
+    if git_dir_env:
+        git_dir = Path(git_dir_env)
+    else:
+        cwd = Path.cwd()
+        for directory in (cwd, *cwd.parents):
+            candidate = directory / ".git"
+            if candidate.is_dir():
+                git_dir = candidate
+                break
+            if candidate.is_file():
+                try:
+                    content = candidate.read_text().strip()
+                except (OSError, UnicodeDecodeError):
+                    return None
+                if not content.startswith("gitdir:"):
+                    return None
+                git_dir = directory / content.removeprefix("gitdir:").strip()
+                break
+        else:
+            return None
+
+    # Linked worktrees keep the shared config in the common directory
+    commondir = git_dir / "commondir"
+    if commondir.is_file():
+        try:
+            git_dir = git_dir / commondir.read_text().strip()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    config_path = git_dir / "config"
+    return config_path if config_path.is_file() else None
+
+
+def read_config_remote_urls() -> List[str]:
+    """
+    Read the remote URLs written in the repository's git config file.
+
+    Inline comments and surrounding quotes are stripped, but `insteadOf`
+    rewrites and remotes pulled in through `include` directives are not
+    resolved.
+
+    Returns:
+        List of remote URLs, empty if the config cannot be located or parsed
+    """
+    config_path = find_git_config()
+    if config_path is None:
+        return []
+
+    parser = configparser.ConfigParser(
+        strict=False,
+        interpolation=None,
+        allow_no_value=True,
+        inline_comment_prefixes=("#", ";"),
+    )
+    try:
+        parser.read_string(config_path.read_text())
+    except (OSError, UnicodeDecodeError, configparser.Error):
+        return []
+
+    # Git allows values to be wrapped in one pair of double quotes
+    return [
+        parser[section]["url"].removeprefix('"').removesuffix('"')
+        for section in parser.sections()
+        if section.startswith('remote "') and parser[section].get("url")
+    ]
+
+
+def read_git_remote_urls() -> List[str]:
+    """
+    Read the resolved URLs of all git remotes via `git remote --verbose`.
+
+    Returns:
+        List of remote URLs
 
     Raises:
-        SystemExit: If DID cannot be inferred
+        SystemExit: If the remotes cannot be read
     """
     try:
         result = subprocess.run(
             ["git", "remote", "--verbose"],
             check=True,
-            capture_output=True,
-            text=True
+            capture_output=True
         )
-    except subprocess.CalledProcessError:
+    except (OSError, subprocess.CalledProcessError):
         die("Could not get git remote information. Are you in a git repository?")
 
-    github_pattern = r"github\.com[/|:](.+?)/(.+?)(\.git)? \((fetch|push)\)"
-
+    # Each line has the form "<name>\t<url> (fetch|push)"; only the
+    # URL field is decoded
+    urls = []
     for line in result.stdout.splitlines():
-        match = re.search(github_pattern, line)
-        if match:
-            owner = match.group(1)
-            repo = match.group(2)
-            did_folder = ":"+did_folder if did_folder else ""
-
-            if repo == f"{owner}.github.io":
-                return f"did:web:{owner}.github.io{did_folder}"
-            else:
-                return f"did:web:{owner}.github.io:{repo}{did_folder}"
+        fields = line.split()
+        if len(fields) >= 2:
+            urls.append(fields[1].decode("utf-8", "replace"))
+    return urls
+
+
+def infer_did_from_git(did_folder: Optional[str] = None) -> str:
+    """
+    Infer DID from git remote configuration.
+
+    The git config file is checked first; git itself is only asked when no
+    GitHub remote is found there (e.g. `insteadOf` aliases or included
+    config files).
+
+    Args:
+        did_folder: Optional folder name for the DID
+
+    Returns:
+        Inferred DID string
+
+    Raises:
+        SystemExit: If DID cannot be inferred
+    """
+    for read_urls in (read_config_remote_urls, read_git_remote_urls):
+        for url in read_urls():
+            match = _GITHUB_URL_RE.search(url)
+            if match:
+                owner = match.group(1)
+                repo = match.group(2)
+                did_folder = ":"+did_folder if did_folder else ""
+
+                if repo == f"{owner}.github.io":
+                    return f"did:web:{owner}.github.io{did_folder}"
+                else:
+                    return f"did:web:{owner}.github.io:{repo}{did_folder}"
 
     die("Could not infer a DID from the git configuration")
 
 
-def load_or_generate_private_key(key_path: Path) -> ec.EllipticCurvePrivateKey:
+def load_or_generate_private_key(
+    key_path: Path,
+    curve: ec.EllipticCurve = DEFAULT_EC_CURVE,
+) -> ec.EllipticCurvePrivateKey:
     """
     Load existing private key or generate a new one.
 
     Args:
         key_path: Path to the private key file
+        curve: Curve to use when generating a new key
 
     Returns:
         EC private key object
@@ -163,7 +333,7 @@ def load_or_generate_private_key(key_path: Path) -> ec.EllipticCurvePrivateKey:
             die(f"Could not load private key: {e}")
     else:
         print(f"Generating new private key at `{key_path}`")
-        private_key = ec.generate_private_key(DEFAULT_EC_CURVE)
+        private_key = ec.generate_private_key(curve)
 
         try:
             key_path.write_bytes(
@@ -179,18 +349,18 @@ def load_or_generate_private_key(key_path: Path) -> ec.EllipticCurvePrivateKey:
         return private_key
 
 
-def create_did_document(did: str, public_key: ec.EllipticCurvePublicKey) -> Dict[str, Any]:
+def create_did_document(did: str, km: KeyMaterial) -> Dict[str, Any]:
     """
     Create a DID document with the given public key.
 
     Args:
         did: The DID identifier
-        public_key: The EC public key
+        km: Key material of the EC public key
 
     Returns:
         DID document as a dictionary
     """
-    key_id = "#" + generate_key_fingerprint(public_key)
+    key_id = "#" + km.fingerprint_hex
 
     return {
         "id": did,
@@ -201,44 +371,114 @@ def create_did_document(did: str, public_key: ec.EllipticCurvePublicKey) -> Dict
                 "type": "JsonWebKey2020",
                 "controller": did,
                 "publicKeyJwk": convert_key_to_jwk(
-                    public_key,
+                    km,
                     kid=key_id,
-                    alg=SIGNING_ALGORITHMS[public_key.curve.key_size],
+                    alg=SIGNING_ALGORITHMS[km.curve_size],
                 ),
             }
         ],
     }
 
 
-def save_and_commit_did_document(document: Dict[str, Any], did_path: str) -> None:
+def serialize_did_document(document: Dict[str, Any]) -> bytes:
     """
-    Save DID document to file and commit to git.
+    Serialize a DID document to indented, key-sorted UTF-8 JSON.
+
+    Uses orjson when available; the stdlib fallback produces identical bytes.
 
     Args:
         document: The DID document dictionary
-        did_path: Path to save the document
+
+    Returns:
+        Encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(document, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(document, indent=2, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+
+def is_did_document_unchanged(payload: bytes, did_path: str) -> bool:
+    """
+    Check whether the DID document on disk already matches the payload.
+
+    Args:
+        payload: Serialized DID document
+        did_path: Path of the existing document
+
+    Returns:
+        True if the file exists with identical content, False otherwise
     """
     try:
-        with open(did_path, "w") as f:
-            json.dump(document, f, indent=2)
+        return Path(did_path).read_bytes() == payload
+    except OSError:
+        return False
+
 
-        subprocess.run(["git", "add", did_path], check=True)
+def is_did_document_committed(did_path: str) -> bool:
+    """
+    Check whether the DID document is tracked and unmodified relative to HEAD.
+
+    Args:
+        did_path: Path of the document
 
-        # Check if there are changes to commit
+    Returns:
+        True if git reports no staged, unstaged or untracked changes for it
+    """
+    try:
         result = subprocess.run(
-            ["git", "diff-index", "--quiet", "HEAD", did_path],
+            ["git", "status", "--porcelain", "--", did_path],
+            check=True,
             capture_output=True
         )
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return not result.stdout.strip()
+
+
+def save_and_commit_did_document(payload: bytes, did_path: str, write: bool = True) -> None:
+    """
+    Save DID document to file and commit to git.
+
+    Args:
+        payload: Serialized DID document
+        did_path: Path to save the document
+        write: Whether to write the payload, False if it is already on disk
+    """
+    try:
+        if write:
+            fd = os.open(did_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+
+        subprocess.run(["git", "add", "--", did_path], check=True)
+
+        # Commit straight away; only consult diff-index if git refused
+        result = subprocess.run(
+            ["git", "commit", "--quiet", "-m", "Update DID document", "--", did_path],
+            capture_output=True,
+            text=True
+        )
 
         if result.returncode != 0:
-            print("Committing the DID document...")
-            subprocess.run([
-                "git", "commit", "--quiet", "--allow-empty",
-                did_path, "-m", "Update DID document"
-            ], check=True)
+            unchanged = subprocess.run(
+                ["git", "diff-index", "--quiet", "HEAD", "--", did_path],
+                capture_output=True
+            )
+            if unchanged.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    result.returncode, result.args, result.stdout, result.stderr
+                )
+            print("DID document unchanged, nothing to commit")
+        else:
+            print("Committed the DID document")
 
     except subprocess.CalledProcessError as e:
-        die(f"Git operation failed: {e}")
+        details = (e.stderr or e.stdout or "").strip()
+        die(f"Git operation failed: {e}" + (f"\n{details}" if details else ""))
     except Exception as e:
         die(f"Could not save DID document: {e}")
 
@@ -246,12 +486,23 @@ def save_and_commit_did_document(document: Dict[str, Any], did_path: str) -> Non
 def main() -> None:
     """Main function to generate and manage DID documents."""
     folder_name = ""
+    args = sys.argv[1:]
+    curve_bits = os.environ.get("DIDWEB_CURVE", "")
+
+    # Parse the optional curve selection
+    if "--curve" in args:
+        index = args.index("--curve")
+        if index + 1 >= len(args):
+            die("`--curve` requires a value")
+        curve_bits = args[index + 1]
+        del args[index:index + 2]
+    curve = parse_curve(curve_bits) if curve_bits else DEFAULT_EC_CURVE
 
     # Parse command line arguments
-    if len(sys.argv) == 1:
+    if len(args) == 0:
         did = infer_did_from_git()
-    elif len(sys.argv) == 2:
-        arg = sys.argv[1]
+    elif len(args) == 1:
+        arg = args[0]
         if arg.startswith("did:web:"):
             did = arg
         else:
@@ -262,23 +513,40 @@ def main() -> None:
             else:
                 die(f"`{arg}` is not a valid DID folder name")
     else:
-        die(f"Usage:\n  {sys.argv[0]}\n  {sys.argv[0]} <folder_name>\n  {sys.argv[0]} did:web:example.com")
+        die(
+            f"Usage:\n  {sys.argv[0]} [--curve 256|384|521]"
+            f"\n  {sys.argv[0]} [--curve 256|384|521] <folder_name>"
+            f"\n  {sys.argv[0]} [--curve 256|384|521] did:web:example.com"
+        )
 
     # Set up paths
     private_key_path = Path(folder_name) / "private_key.pem" if folder_name else Path("private_key.pem")
     did_document_path = f"{folder_name}/did.json" if folder_name else "did.json"
 
     # Load or generate private key
-    private_key = load_or_generate_private_key(private_key_path)
-    public_key = private_key.public_key()
+    private_key = load_or_generate_private_key(private_key_path, curve)
+    if curve_bits and private_key.curve.key_size != curve.key_size:
+        die(
+            f"`{private_key_path}` uses {EC_CURVE_NAMES[private_key.curve.key_size]}"
+            f" but {EC_CURVE_NAMES[curve.key_size]} was requested; remove the key"
+            " to generate a new one or drop the curve option"
+        )
+    km = KeyMaterial.from_public_key(private_key.public_key())
 
     # Create and save DID document
     print(f"Creating DID document for `{did}`...")
-    key_id = "#" + generate_key_fingerprint(public_key)
-    print(f"Key ID: `{key_id}`")
+    print(f"Key ID: `#{km.fingerprint_hex}`")
+
+    document = create_did_document(did, km)
+    payload = serialize_did_document(document)
+
+    # An unchanged file may still be uncommitted if a previous commit failed
+    unchanged = is_did_document_unchanged(payload, did_document_path)
+    if unchanged and is_did_document_committed(did_document_path):
+        print(f"`{did_document_path}` is unchanged, nothing to do")
+        return
 
-    document = create_did_document(did, public_key)
-    save_and_commit_did_document(document, did_document_path)
+    save_and_commit_did_document(payload, did_document_path, write=not unchanged)
 
     # Print completion message
     print("Done!")